@@ -28,7 +28,6 @@
 import argparse
 import numpy as np
 import sys
-import queue
 import uuid
 import asyncio
 
@@ -36,14 +35,8 @@ import tritonclient.grpc.aio as grpcclient
 from tritonclient.utils import InferenceServerException
 
 
-class UserData:
-
-    def __init__(self):
-        self._completed_requests = queue.Queue()
-
-
-async def async_stream_yield(values, batch_size, sequence_id, model_name,
-                             model_version):
+async def async_stream_send(request_queue, values, batch_size, sequence_id,
+                            model_name, model_version):
     count = 1
     for value in values:
         # Create the tensor for INPUT
@@ -56,8 +49,9 @@ async def async_stream_yield(values, batch_size, sequence_id, model_name,
         inputs[0].set_data_from_numpy(value_data)
         outputs = []
         outputs.append(grpcclient.InferRequestedOutput('OUTPUT'))
-        # Issue the asynchronous sequence inference.
-        yield {
+        # Hand the request over to the stream. This waits until the
+        # stream has taken the previous request from the queue.
+        await request_queue.put({
             "model_name": model_name,
             "inputs": inputs,
             "outputs": outputs,
@@ -65,8 +59,11 @@ async def async_stream_yield(values, batch_size, sequence_id, model_name,
             "sequence_id": sequence_id,
             "sequence_start": (count == 1),
             "sequence_end": (count == len(values))
-        }
+        })
         count = count + 1
+    # Signal that this sequence has no more requests. A failed producer
+    # never gets here, main() stops the whole stream in that case.
+    await request_queue.put(None)
 
 
 async def main(FLAGS):
@@ -102,66 +99,95 @@ async def main(FLAGS):
     async with grpcclient.InferenceServerClient(
             url=FLAGS.url, verbose=FLAGS.verbose) as triton_client:
 
-        # Request iterator that yields the next request
+        # The three sequences are multiplexed over a single stream through
+        # this queue. It only holds one request so a producer must wait for
+        # the stream to consume it, which lets the other sequences' requests
+        # be interleaved instead of each sequence being queued in full.
+        request_queue = asyncio.Queue(maxsize=1)
+        sequence_count = 3
+
+        # Request iterator that yields the next request until every
+        # sequence has been sent
         async def async_request_iterator():
-            async for request in async_stream_yield([0] + values, batch_size,
-                                                    int_sequence_id0,
-                                                    int_sequence_model_name,
-                                                    model_version):
-                yield request
-            async for request in async_stream_yield(
-                [100] + [-1 * val for val in values], batch_size,
-                    int_sequence_id1, int_sequence_model_name, model_version):
-                yield request
-            async for request in async_stream_yield(
-                [20] + [-1 * val for val in values], batch_size,
-                    string_sequence_id0, string_sequence_model_name,
-                    model_version):
-                yield request
+            done_count = 0
+            while done_count < sequence_count:
+                request = await request_queue.get()
+                if request is None:
+                    done_count += 1
+                else:
+                    yield request
+
+        # Route each response to its result list using the sequence ID
+        # embedded in the request ID.
+        routes = {
+            str(int_sequence_id0): int_result0_list,
+            str(int_sequence_id1): int_result1_list,
+            string_sequence_id0: string_result0_list
+        }
+
+        async def async_stream_receive(response_iterator):
+            # Read response from the stream
+            recv_count = 0
+            async for response in response_iterator:
+                result, error = response
+                if error:
+                    raise error
+                this_id = result.get_response().id.partition('_')[0]
+                target = routes.get(this_id)
+                if target is None:
+                    raise InferenceServerException(
+                        msg="unexpected sequence id returned by the server: {}"
+                        .format(this_id))
+                target.append(result.as_numpy('OUTPUT'))
+                recv_count += 1
+            if recv_count != sequence_count * (len(values) + 1):
+                raise InferenceServerException(
+                    msg="stream closed before all responses were received")
 
         try:
             # Start streaming
             response_iterator = triton_client.stream_infer(
                 inputs_iterator=async_request_iterator(),
                 stream_timeout=FLAGS.stream_timeout)
-            # Read response from the stream
-            user_data = UserData()
-            async for response in response_iterator:
-                result, error = response
-                if error:
-                    user_data._completed_requests.put(error)
-                else:
-                    user_data._completed_requests.put(result)
+            # Now send the inference sequences concurrently while reading
+            # the responses
+            producers = [
+                asyncio.create_task(
+                    async_stream_send(request_queue, [0] + values, batch_size,
+                                      int_sequence_id0,
+                                      int_sequence_model_name, model_version)),
+                asyncio.create_task(
+                    async_stream_send(request_queue,
+                                      [100] + [-1 * val for val in values],
+                                      batch_size, int_sequence_id1,
+                                      int_sequence_model_name, model_version)),
+                asyncio.create_task(
+                    async_stream_send(request_queue,
+                                      [20] + [-1 * val for val in values],
+                                      batch_size, string_sequence_id0,
+                                      string_sequence_model_name,
+                                      model_version))
+            ]
+            receiver = asyncio.create_task(
+                async_stream_receive(response_iterator))
+            # Wait until the stream is over or any task fails, then cancel
+            # whatever is left so that no producer stays blocked on the
+            # queue once nothing reads from it anymore.
+            pending = set(producers) | {receiver}
+            try:
+                while receiver in pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
         except InferenceServerException as error:
             print(error)
             sys.exit(1)
 
-        # Retrieve results
-        recv_count = 0
-        while recv_count < (3 * (len(values) + 1)):
-            data_item = user_data._completed_requests.get()
-            if type(data_item) == InferenceServerException:
-                print(data_item)
-                sys.exit(1)
-            else:
-                try:
-                    this_id = data_item.get_response().id.split('_')[0]
-                    if int(this_id) == int_sequence_id0:
-                        int_result0_list.append(data_item.as_numpy('OUTPUT'))
-                    elif int(this_id) == int_sequence_id1:
-                        int_result1_list.append(data_item.as_numpy('OUTPUT'))
-                    elif this_id == string_sequence_id0:
-                        string_result0_list.append(data_item.as_numpy('OUTPUT'))
-                    else:
-                        print(
-                            "unexpected sequence id returned by the server: {}".
-                            format(this_id))
-                        sys.exit(1)
-                except ValueError:
-                    string_result0_list.append(data_item.as_numpy('OUTPUT'))
-
-            recv_count = recv_count + 1
-
     # Check results
     for i in range(len(int_result0_list)):
         int_seq0_expected = 1 if (i == 0) else values[i - 1]
@@ -25,7 +25,6 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from functools import partial
 import argparse
 import numpy as np
 import sys
@@ -41,46 +40,74 @@ FLAGS = None
 class UserData:
 
     def __init__(self):
-        self._completed_requests = queue.Queue()
+        self._completed_requests = queue.SimpleQueue()
 
+    # Define the callback function. Note the last two parameters should be
+    # result and error. InferenceServerClient would povide the results of an
+    # inference as grpcclient.InferResult in result. For successful
+    # inference, error will be None, otherwise it will be an object of
+    # tritonclientutils.InferenceServerException holding the error details
+    def on_result(self, result, error):
+        self._completed_requests.put(error if error else result)
 
-# Define the callback function. Note the last two parameters should be
-# result and error. InferenceServerClient would povide the results of an
-# inference as grpcclient.InferResult in result. For successful
-# inference, error will be None, otherwise it will be an object of
-# tritonclientutils.InferenceServerException holding the error details
-def callback(user_data, result, error):
-    if error:
-        user_data._completed_requests.put(error)
-    else:
-        user_data._completed_requests.put(result)
 
+def async_stream_send(triton_client, values, sequence_id, model_name,
+                      model_version, result_list, result_routes):
+
+    # 'values' holds the input tensor of every request in the sequence
+    # stacked along the first axis, so each request only needs a view of
+    # it. The request objects are created once and reused for the whole
+    # sequence.
+    infer_input = grpcclient.InferInput('INPUT', values.shape[1:], "INT32")
+    infer_output = grpcclient.InferRequestedOutput('OUTPUT')
+    inputs = (infer_input,)
+    outputs = (infer_output,)
+
+    seq_len = len(values)
+    if seq_len == 0:
+        return
 
-def async_stream_send(triton_client, values, batch_size, sequence_id,
-                      model_name, model_version):
+    # Only the first and the last request mark the boundaries of the
+    # sequence, so they are issued outside of the loop.
+    infer_input.set_data_from_numpy(values[0])
+    request_id = '{}_1'.format(sequence_id)
+    result_routes[request_id] = result_list
+    triton_client.async_stream_infer(model_name=model_name,
+                                     inputs=inputs,
+                                     outputs=outputs,
+                                     request_id=request_id,
+                                     sequence_id=sequence_id,
+                                     sequence_start=True,
+                                     sequence_end=(seq_len == 1))
+    if seq_len == 1:
+        return
 
-    count = 1
-    for value in values:
-        # Create the tensor for INPUT
-        value_data = np.full(shape=[batch_size, 1],
-                             fill_value=value,
-                             dtype=np.int32)
-        inputs = []
-        inputs.append(grpcclient.InferInput('INPUT', value_data.shape, "INT32"))
+    for count, value_data in enumerate(values[1:-1], start=2):
         # Initialize the data
-        inputs[0].set_data_from_numpy(value_data)
-        outputs = []
-        outputs.append(grpcclient.InferRequestedOutput('OUTPUT'))
+        infer_input.set_data_from_numpy(value_data)
+        # Register where the response to this request should be collected
+        # before the request is issued.
+        request_id = '{}_{}'.format(sequence_id, count)
+        result_routes[request_id] = result_list
         # Issue the asynchronous sequence inference.
         triton_client.async_stream_infer(model_name=model_name,
                                          inputs=inputs,
                                          outputs=outputs,
-                                         request_id='{}_{}'.format(
-                                             sequence_id, count),
+                                         request_id=request_id,
                                          sequence_id=sequence_id,
-                                         sequence_start=(count == 1),
-                                         sequence_end=(count == len(values)))
-        count = count + 1
+                                         sequence_start=False,
+                                         sequence_end=False)
+
+    infer_input.set_data_from_numpy(values[-1])
+    request_id = '{}_{}'.format(sequence_id, seq_len)
+    result_routes[request_id] = result_list
+    triton_client.async_stream_infer(model_name=model_name,
+                                     inputs=inputs,
+                                     outputs=outputs,
+                                     request_id=request_id,
+                                     sequence_id=sequence_id,
+                                     sequence_start=False,
+                                     sequence_end=True)
 
 
 if __name__ == '__main__':
@@ -130,6 +157,20 @@ if __name__ == '__main__':
 
     values = [11, 7, 5, 3, 2, 0, 1]
 
+    # Materialize the input tensors of each sequence up front as a single
+    # [sequence length, batch_size, 1] array.
+    values_arr = np.asarray(values, dtype=np.int32)
+    neg_values = -values_arr
+
+    def sequence_data(start_value, sequence_values):
+        data = np.concatenate(
+            (np.asarray([start_value], dtype=np.int32), sequence_values))
+        return np.repeat(data.reshape(-1, 1, 1), batch_size, axis=1)
+
+    int_sequence_data0 = sequence_data(0, values_arr)
+    int_sequence_data1 = sequence_data(100, neg_values)
+    string_sequence_data0 = sequence_data(20, neg_values)
+
     # Will use two sequences and send them asynchronously. Note the
     # sequence IDs should be non-zero because zero is reserved for
     # non-sequence requests.
@@ -148,6 +189,9 @@ if __name__ == '__main__':
 
     string_result0_list = []
 
+    # Maps the ID of every request sent to the list collecting its result
+    result_routes = {}
+
     user_data = UserData()
 
     # It is advisable to use client object within with..as clause
@@ -157,81 +201,105 @@ if __name__ == '__main__':
             url=FLAGS.url, verbose=FLAGS.verbose) as triton_client:
         try:
             # Establish stream
-            triton_client.start_stream(callback=partial(callback, user_data),
+            triton_client.start_stream(callback=user_data.on_result,
                                        stream_timeout=FLAGS.stream_timeout)
             # Now send the inference sequences...
-            async_stream_send(triton_client, [0] + values, batch_size,
+            async_stream_send(triton_client, int_sequence_data0,
                               int_sequence_id0, int_sequence_model_name,
-                              model_version)
-            async_stream_send(triton_client,
-                              [100] + [-1 * val for val in values], batch_size,
+                              model_version, int_result0_list, result_routes)
+            async_stream_send(triton_client, int_sequence_data1,
                               int_sequence_id1, int_sequence_model_name,
-                              model_version)
-            async_stream_send(triton_client,
-                              [20] + [-1 * val for val in values], batch_size,
+                              model_version, int_result1_list, result_routes)
+            async_stream_send(triton_client, string_sequence_data0,
                               string_sequence_id0, string_sequence_model_name,
-                              model_version)
+                              model_version, string_result0_list,
+                              result_routes)
         except InferenceServerException as error:
             print(error)
             sys.exit(1)
 
         # Retrieve results...
+        # Errors are collected so that the remaining responses are still
+        # drained from the stream; they are reported once all arrived.
+        # An error of the stream itself carries a gRPC status and is the
+        # last item the stream delivers, so draining stops there.
+        errors = []
+        stream_failed = False
+        completed_requests = user_data._completed_requests
         recv_count = 0
-        while recv_count < (3 * (len(values) + 1)):
-            data_item = user_data._completed_requests.get()
-            if type(data_item) == InferenceServerException:
-                print(data_item)
-                sys.exit(1)
-            else:
-                try:
-                    this_id = data_item.get_response().id.split('_')[0]
-                    if int(this_id) == int_sequence_id0:
-                        int_result0_list.append(data_item.as_numpy('OUTPUT'))
-                    elif int(this_id) == int_sequence_id1:
-                        int_result1_list.append(data_item.as_numpy('OUTPUT'))
-                    elif this_id == string_sequence_id0:
-                        string_result0_list.append(data_item.as_numpy('OUTPUT'))
-                    else:
-                        print(
-                            "unexpected sequence id returned by the server: {}".
+        while not stream_failed and recv_count < (3 * (len(values) + 1)):
+            # Block until a response is available, then drain everything
+            # else that is already queued without blocking.
+            data_item = completed_requests.get()
+            while data_item is not None:
+                if type(data_item) == InferenceServerException:
+                    errors.append(data_item)
+                    if data_item.status() is not None:
+                        stream_failed = True
+                        break
+                else:
+                    this_id = data_item.get_response().id
+                    target = result_routes.get(this_id)
+                    if target is None:
+                        errors.append(
+                            "unexpected request id returned by the server: {}".
                             format(this_id))
-                        sys.exit(1)
-                except ValueError:
-                    string_result0_list.append(data_item.as_numpy('OUTPUT'))
-
-            recv_count = recv_count + 1
-
-    for i in range(len(int_result0_list)):
-        int_seq0_expected = 1 if (i == 0) else values[i - 1]
-        int_seq1_expected = 101 if (i == 0) else values[i - 1] * -1
-
-        # For string sequence ID we are testing two different backends
-        if i == 0 and FLAGS.dyna:
-            string_seq0_expected = 20
-        elif i == 0 and not FLAGS.dyna:
-            string_seq0_expected = 21
-        elif i != 0 and FLAGS.dyna:
-            string_seq0_expected = values[i - 1] * -1 + int(
-                string_result0_list[i - 1][0][0])
-        else:
-            string_seq0_expected = values[i - 1] * -1
-
-        # The dyna_sequence custom backend adds the correlation ID
-        # to the last request in a sequence.
-        if FLAGS.dyna and (i != 0) and (values[i - 1] == 1):
-            int_seq0_expected += int_sequence_id0
-            int_seq1_expected += int_sequence_id1
-            string_seq0_expected += int(string_sequence_id0)
-
-        print("[" + str(i) + "] " + str(int_result0_list[i][0][0]) + " : " +
-              str(int_result1_list[i][0][0]) + " : " +
-              str(string_result0_list[i][0][0]))
-
-        if ((int_seq0_expected != int_result0_list[i][0][0]) or
-            (int_seq1_expected != int_result1_list[i][0][0]) or
-            (string_seq0_expected != string_result0_list[i][0][0])):
-            print("[ expected ] " + str(int_seq0_expected) + " : " +
-                  str(int_seq1_expected) + " : " + str(string_seq0_expected))
-            sys.exit(1)
+                    else:
+                        target.append(data_item.as_numpy('OUTPUT'))
+
+                recv_count = recv_count + 1
+                try:
+                    data_item = completed_requests.get_nowait()
+                except queue.Empty:
+                    data_item = None
+
+    if errors:
+        for error in errors:
+            print(error)
+        sys.exit(1)
+
+    # Each result holds a single element, read them as Python scalars
+    int_results0 = [result.item(0) for result in int_result0_list]
+    int_results1 = [result.item(0) for result in int_result1_list]
+    string_results0 = [result.item(0) for result in string_result0_list]
+
+    # Build the expected output of every request up front
+    int_seq0_expected = np.concatenate(([1], values_arr)).astype(np.int64)
+    int_seq1_expected = np.concatenate(([101], neg_values)).astype(np.int64)
+
+    # For string sequence ID we are testing two different backends
+    if FLAGS.dyna:
+        string_seq0_expected = np.concatenate(
+            ([20], neg_values + np.asarray(string_results0[:-1],
+                                           dtype=np.int64)))
+    else:
+        string_seq0_expected = np.concatenate(
+            ([21], neg_values)).astype(np.int64)
+
+    # The dyna_sequence custom backend adds the correlation ID
+    # to the last request in a sequence.
+    if FLAGS.dyna:
+        sequence_end_mask = np.concatenate(([False], values_arr == 1))
+        int_seq0_expected[sequence_end_mask] += int_sequence_id0
+        int_seq1_expected[sequence_end_mask] += int_sequence_id1
+        string_seq0_expected[sequence_end_mask] += int(string_sequence_id0)
+
+    lines = [
+        f"[{i}] {r0} : {r1} : {s0}" for i, (r0, r1, s0) in enumerate(
+            zip(int_results0, int_results1, string_results0))
+    ]
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+    if not (np.array_equal(int_seq0_expected, int_results0) and
+            np.array_equal(int_seq1_expected, int_results1) and
+            np.array_equal(string_seq0_expected, string_results0)):
+        i = np.flatnonzero((int_seq0_expected != int_results0) |
+                           (int_seq1_expected != int_results1) |
+                           (string_seq0_expected != string_results0))[0]
+        sys.stdout.write(f"[ expected {i} ] {int_seq0_expected[i].item()} : "
+                         f"{int_seq1_expected[i].item()} : "
+                         f"{string_seq0_expected[i].item()}\n")
+        sys.exit(1)
 
     print("PASS: Sequence")
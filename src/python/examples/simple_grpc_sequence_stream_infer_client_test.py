@@ -58,10 +58,12 @@ def callback(user_data, result, error):
 
 
 def async_stream_send(triton_client, values, batch_size, sequence_id,
-                      model_name, model_version):
+                      model_name, model_version, verbose=False):
 
-    count = 1
-    for value in values:
+    seq_len = len(values)
+    for count, value in enumerate(values, start=1):
+        start = (count == 1)
+        end = (count == seq_len)
         # Create the tensor for INPUT
         value_data = np.full(shape=[batch_size, 1],
                              fill_value=value,
@@ -78,11 +80,12 @@ def async_stream_send(triton_client, values, batch_size, sequence_id,
                                          outputs=outputs,
                                          request_id='{}_{}'.format(sequence_id, count),
                                          sequence_id=sequence_id,
-                                         sequence_start=(count == 1),
-                                         sequence_end=(count == len(values)))
-        print("[model_name] {}, [sequence_id] {}, [start:{}|end:{}], [input_value] {}".format(
-            model_name, sequence_id, (count == 1), (count == len(values)), value_data))
-        count = count + 1
+                                         sequence_start=start,
+                                         sequence_end=end)
+        if verbose:
+            sys.stdout.write(
+                f"[model_name] {model_name}, [sequence_id] {sequence_id}, "
+                f"[start:{start}|end:{end}], [input_value] {value}\n")
 
 
 if __name__ == '__main__':
@@ -175,15 +178,15 @@ if __name__ == '__main__':
             # Now send the inference sequences...
             async_stream_send(triton_client, [0] + values, batch_size,
                               int_sequence_id0, int_sequence_model_name,
-                              model_version)
+                              model_version, FLAGS.verbose)
             async_stream_send(triton_client,
                               [100] + [-1 * val for val in values], batch_size,
                               int_sequence_id1, int_sequence_model_name,
-                              model_version)
+                              model_version, FLAGS.verbose)
             async_stream_send(triton_client,
                               [20] + [-1 * val for val in values], batch_size,
                               string_sequence_id0, string_sequence_model_name,
-                              model_version)
+                              model_version, FLAGS.verbose)
         except InferenceServerException as error:
             print(error)
             sys.exit(1)
@@ -196,21 +199,23 @@ if __name__ == '__main__':
                 print(data_item)
                 sys.exit(1)
             else:
+                response_id = data_item.get_response().id
+                out_np = data_item.as_numpy('OUTPUT')
                 try:
-                    this_id = data_item.get_response().id.split('_')[0]         # 这边获取到的是sequence_id
+                    this_id = response_id.partition('_')[0]     # 这边获取到的是sequence_id
                     if int(this_id) == int_sequence_id0:
-                        int_result0_list.append(data_item.as_numpy('OUTPUT'))
+                        int_result0_list.append(out_np)
                     elif int(this_id) == int_sequence_id1:
-                        int_result1_list.append(data_item.as_numpy('OUTPUT'))
+                        int_result1_list.append(out_np)
                     elif this_id == string_sequence_id0:
-                        string_result0_list.append(data_item.as_numpy('OUTPUT'))
+                        string_result0_list.append(out_np)
                     else:
                         print(
                             "unexpected sequence id returned by the server: {}".
                             format(this_id))
                         sys.exit(1)
                 except ValueError:
-                    string_result0_list.append(data_item.as_numpy('OUTPUT'))
+                    string_result0_list.append(out_np)
 
             recv_count = recv_count + 1
 